@@ -0,0 +1,135 @@
+"""
+Measures the cold start of the GUI: the time from launching a fresh Python process until the window
+is shown (first frame) and until the Korean font is ready (a few frames after it has been loaded).
+
+Run from the repository root (a display is needed):
+
+    python benchmarks/gui_startup.py --runs 5 --max_window_seconds 2.0
+
+Exits with a non-zero status if the median time to show the window exceeds --max_window_seconds.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ? Font is bound on FONT_LOAD_FRAME, the atlas is rebuilt on the next frame and used on the one after
+FONT_READY_FRAME_OFFSET = 2
+
+
+def child():
+    """
+    Starts the GUI like run.py does and prints when the frames of interest are rendered
+    """
+    import dearpygui.dearpygui as dpg
+
+    from html_style_enhancer.enhance import TODAY_DATE
+    from html_style_enhancer.gui import FONT_LOAD_FRAME
+    from html_style_enhancer.gui import Configuration
+    from html_style_enhancer.gui import setup
+
+    timings: dict[str, float] = {"imported": time.time()}
+
+    def window_shown():
+        timings["window_shown"] = time.time()
+
+    def font_ready():
+        timings["font_ready"] = time.time()
+        dpg.stop_dearpygui()
+
+    with tempfile.NamedTemporaryFile(suffix=".xlsx") as input_file:
+        setup(
+            Configuration(
+                input_file=input_file.name,
+                output_file="RESULT.xlsx",
+                selector="div",
+                font="Roboto",
+                font_size=24,
+                font_color="rgb(112, 69, 69)",
+                background_image="",
+                today_date=TODAY_DATE,
+                log_file=os.devnull,
+                test_mode=False,
+                html_source_column="상품상세설명\n[필수]",
+                html_source_modified_column="상품상세설명\n[사방넷]",
+                queue_size=8,
+                workers=1,
+                output_engine="openpyxl",
+                on_error="fail",
+            )
+        )
+        dpg.set_frame_callback(1, window_shown)
+        dpg.set_frame_callback(FONT_LOAD_FRAME + FONT_READY_FRAME_OFFSET, font_ready)
+
+        dpg.start_dearpygui()
+        dpg.destroy_context()
+
+    print(json.dumps(timings))
+
+
+def measure() -> dict[str, float]:
+    started = time.time()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        cwd=REPOSITORY_ROOT,
+        env={**os.environ, "PYTHONPATH": REPOSITORY_ROOT},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    timings: dict[str, float] = json.loads(output.strip().splitlines()[-1])
+    return {name: timestamp - started for name, timestamp in timings.items()}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+
+    parser.add_argument(
+        "--runs",
+        help="Number of cold starts to measure",
+        type=int,
+        default=5,
+    )
+    parser.add_argument(
+        "--max_window_seconds",
+        help="Fail if the median time until the window is shown is greater than this",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--child",
+        help="Internal: run the GUI and print the timings",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        sys.exit(0)
+
+    runs = [measure() for _ in range(args.runs)]
+
+    medians: dict[str, float] = {
+        name: statistics.median(run[name] for run in runs) for name in runs[0]
+    }
+    for name, median in medians.items():
+        print(f"{name}: {median:.3f}s (median of {args.runs})")
+
+    if (
+        args.max_window_seconds is not None
+        and medians["window_shown"] > args.max_window_seconds
+    ):
+        print(
+            f"Window was shown in {medians['window_shown']:.3f}s, more than {args.max_window_seconds}s"
+        )
+        sys.exit(1)
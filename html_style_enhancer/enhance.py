@@ -1,29 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import os
 import re
 
 from datetime import datetime
 from functools import cache
+from functools import partial
 from pathlib import Path
 from typing import TYPE_CHECKING
 from typing import Any
 
-import pandas as pd
-
-from aiofile import AIOFile
 from bs4 import BeautifulSoup
+from bs4 import Tag
+from openpyxl import Workbook
+from openpyxl import load_workbook
 
 from html_style_enhancer.excel import copy_dataframe_cells_to_excel_template
 from html_style_enhancer.excel import get_column_mapping
 from html_style_enhancer.log import logger
+from html_style_enhancer.pipeline import PIPELINE_BATCH_SIZE
+from html_style_enhancer.pipeline import batched
+from html_style_enhancer.pipeline import run_pipeline
+from html_style_enhancer.preflight import find_styled_element
+from html_style_enhancer.preflight import preflight
+from html_style_enhancer.preflight import report_problems
 
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Iterator
+
     from html_style_enhancer.settings import Settings
 
 TODAY_DATE = f"{datetime.now().strftime('%Y%m%d')}"
 
+# ? Stamped on the styled element, so that an already enhanced html can be recognized without parsing it
+PROFILE_ATTRIBUTE = "data-style-profile"
+
 
 @cache
 def compile_regex(r: str):
@@ -45,90 +60,275 @@ def parse_int(text: str) -> int:
         ) from e
 
 
-def get_html_sources(settings: Settings) -> list[str]:
-    df = pd.read_excel(settings.input_file, dtype="str")
+def cell_text(value: Any) -> str:
+    """
+    Converts a cell value like pandas.read_excel(dtype="str") followed by astype(str) does, an empty cell being "nan"
+    """
+    if value is None or value == "":
+        return "nan"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
 
-    for column in [
-        settings.html_source_column,
-        settings.html_source_modified_column,
-    ]:
-        try:
-            df[column]
-        except KeyError as e:
-            error = f'"{column}" column is not present in file "{os.path.basename(settings.input_file)}"'
-            raise KeyError(error) from e
 
-    return df[settings.html_source_column].astype(str).tolist()
+def iter_html_sources(
+    settings: Settings, chunk_size: int = PIPELINE_BATCH_SIZE
+) -> Iterator[list[str]]:
+    """
+    Streams the html sources of the first sheet of the input file in chunks, without loading the whole workbook
 
+    Reads the same rows as pandas.read_excel: the blank rows at the end of the sheet are dropped.
+    Will throw KeyError if the html source column or the modified column is not present in the file
+    """
+    workbook = load_workbook(settings.input_file, read_only=True)
 
-def generate_styling(settings: Settings):
-    return f"""font-family:'{settings.font}';font-size:{settings.font_size}px;color:{settings.font_color};background-image:url('{settings.background_image}');background-repeat:no-repeat;background-position:center center;height:100%;"""
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [cell_text(value) for value in next(rows, ())]
 
+        for column in [
+            settings.html_source_column,
+            settings.html_source_modified_column,
+        ]:
+            if column not in header:
+                raise KeyError(
+                    f'"{column}" column is not present in file "{os.path.basename(settings.input_file)}"'
+                )
 
-async def enhance(settings: Settings):
-    logger.log("ACTION", f"Reading <blue>{settings.input_file}</> ...")
+        column = header.index(settings.html_source_column)
 
-    html_sources = get_html_sources(settings)
+        chunk: list[str] = []
+        # ? Blank rows are only kept if a row with data follows them
+        blank_rows = 0
 
-    series_list: list[dict[str, str]] = []
+        for row in rows:
+            if all(value is None or value == "" for value in row):
+                blank_rows += 1
+                continue
 
-    logger.log("ACTION", "Generating HTML Styling (it will take some time) ...")
+            chunk.extend(["nan"] * blank_rows)
+            blank_rows = 0
+            chunk.append(cell_text(row[column] if column < len(row) else None))
+
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def get_html_sources(settings: Settings) -> list[str]:
+    return [
+        html_source for chunk in iter_html_sources(settings) for html_source in chunk
+    ]
+
+
+def generate_styling(settings: Settings):
+    return f"""font-family:'{settings.font}';font-size:{settings.font_size}px;color:{settings.font_color};background-image:url('{settings.background_image}');background-repeat:no-repeat;background-position:center center;height:100%;"""
+
+
+@cache
+def styling_profile(selector: str, styling: str) -> str:
+    return hashlib.sha256(f"{selector}\n{styling}".encode("utf-8")).hexdigest()[:16]
 
-    for idx, html_source in enumerate(html_sources, start=1):
-        html_path = os.path.join("temp", TODAY_DATE, f"html_{idx}.html")
-        os.makedirs(os.path.join("temp", TODAY_DATE), exist_ok=True)
 
-        async with AIOFile(html_path, "w", encoding="utf-8") as f:
-            await f.write(html_source)
+@cache
+def profile_marker(selector: str, styling: str) -> str:
+    """
+    Returns the attribute (as BeautifulSoup serializes it) stamped on the element styled with this selector and styling
+    """
+    return f'{PROFILE_ATTRIBUTE}="{styling_profile(selector, styling)}"'
 
-        async with AIOFile(html_path, "r", encoding="utf-8") as f:
-            document = BeautifulSoup(await f.read(), "html.parser")
 
-        # ? First div element
-        tag = document.select_one(settings.selector)
-        if not tag:
-            raise ValueError(
-                f"Element not found in html using selector: {settings.selector}"
-            )
+def style_html(
+    html_source: str, *, selector: str, styling: str, on_error: str = "fail"
+) -> tuple[str, str | None]:
+    """
+    Appends the styling to the element matched by the selector (and makes its children inherit the color)
 
-        tag["style"] = f"{tag['style']};{generate_styling(settings)}"  # type: ignore
+    Returns the modified html and the problem which prevented styling it (None if it has been styled).
+    If the html has already been enhanced with the same selector and styling, returns it unchanged without parsing it.
+    If the html can't be styled, returns it unchanged if on_error is "keep-original", an empty string if it is "skip",
+    and throws ValueError if it is "fail"
+    """
+    if profile_marker(selector, styling) in html_source:
+        return html_source, None
+
+    document = BeautifulSoup(html_source, "html.parser")
 
-        childrens: Any = tag.children  # type: ignore
-        for children in childrens:  # type: ignore
+    # ? First div element
+    try:
+        tag = find_styled_element(document, selector)
+    except ValueError as e:
+        if on_error == "keep-original":
+            return html_source, str(e)
+        if on_error == "skip":
+            return "", str(e)
+        raise
+
+    profile = styling_profile(selector, styling)
+    # ? Marker written in a different way (e.g., with single quotes) by another tool
+    if tag.get(PROFILE_ATTRIBUTE) == profile:
+        return html_source, None
+
+    tag["style"] = f"{tag['style']};{styling}"  # type: ignore
+    tag[PROFILE_ATTRIBUTE] = profile
+
+    for children in tag.children:
+        # ? Skip the whitespace between the children
+        if isinstance(children, Tag):
             children["style"] = f"{children['style']};color:inherit;"
 
-        modified_html = str(document)
+    return str(document), None
 
-        async with AIOFile(html_path, "w", encoding="utf-8") as f:
-            await f.write(modified_html)
 
-        series: dict[str, str] = {
-            settings.html_source_column: html_source,
-            settings.html_source_modified_column: modified_html,
-        }
+async def style_rows(
+    settings: Settings,
+    html_chunks: Iterator[list[str]],
+    first_row: int = 1,
+    temp_directory: str = os.path.join("temp", TODAY_DATE),
+    on_rows: Callable[[list[str], list[str]], None] | None = None,
+) -> list[str]:
+    """
+    Checks and styles the chunks of html sources, first_row is the (1-based) index of the first html source in the input file.
+    The styled rows are passed to on_rows (in a thread, in order) as soon as they are ready.
 
-        series_list.append(series)
+    With on_error "fail", every row is checked before styling so that a bad row fails the run right away, which means
+    that the input is read in full first. Otherwise the chunks are styled as they are read, and the rows that can't be
+    styled are reported by the styling pass itself.
+    """
+    styling = generate_styling(settings)
+    marker = profile_marker(settings.selector, styling)
 
-    df = pd.DataFrame(series_list)
+    if settings.on_error == "fail":
+        html_sources = [
+            html_source
+            for chunk in await asyncio.to_thread(list, html_chunks)
+            for html_source in chunk
+        ]
 
-    output_filename = os.path.join("output", TODAY_DATE, settings.output_file)
+        logger.log("ACTION", f"Checking {len(html_sources)} rows ...")
+        await preflight(settings, html_sources, first_row, marker)
 
-    if os.path.exists(output_filename):
-        os.remove(output_filename)
+        html_chunks = batched(html_sources)
 
-    df.to_excel(output_filename, engine="openpyxl", index=False)
+    logger.log("ACTION", "Generating HTML Styling (it will take some time) ...")
 
-    logger.log(
-        "ACTION",
-        f"Formatting {Path(output_filename).name} ... <yellow>(it may take a few seconds, so wait for it to be finished.)</>",
+    result = await run_pipeline(
+        settings,
+        html_chunks,
+        partial(
+            style_html,
+            selector=settings.selector,
+            styling=styling,
+            on_error=settings.on_error,
+        ),
+        temp_directory,
+        first_row,
+        on_rows,
+        skip=lambda html_source: marker in html_source,
     )
 
-    column_mapping = get_column_mapping(settings.input_file, output_filename)
+    logger.debug(f"Pipeline queue depth: {result.stats}")
+
+    if result.skipped:
+        logger.info(
+            f"{result.skipped} row(s) were already enhanced with the same styling, they have been kept as they are"
+        )
+
+    if result.problems:
+        report_problems(result.problems)
+        logger.warning(
+            f"{len(result.problems)} row(s) couldn't be styled, they have been handled with on_error=<blue>{settings.on_error}</>"
+        )
 
-    copy_dataframe_cells_to_excel_template(
-        filename=output_filename,
-        template_filename=os.path.abspath(settings.input_file),
-        column_mapping=column_mapping,
+    return result.modified_htmls
+
+
+class OutputWriter:
+    """
+    Writes the html sources and the modified html to the output file as they come (the rows of a write-only workbook
+    are streamed to disk), then copies them into the input file used as the template
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        output_directory: str = os.path.join("output", TODAY_DATE),
+    ):
+        self.settings = settings
+        self.output_filename = os.path.join(output_directory, settings.output_file)
+
+        self.workbook = Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet()
+        self.worksheet.append(
+            [settings.html_source_column, settings.html_source_modified_column]
+        )
+
+    def write_rows(self, html_sources: list[str], modified_htmls: list[str]):
+        for html_source, modified_html in zip(html_sources, modified_htmls):
+            self.worksheet.append([html_source, modified_html])
+
+    def save(self) -> str:
+        if os.path.exists(self.output_filename):
+            os.remove(self.output_filename)
+
+        self.workbook.save(self.output_filename)
+
+        logger.log(
+            "ACTION",
+            f"Formatting {Path(self.output_filename).name} ... <yellow>(it may take a few seconds, so wait for it to be finished.)</>",
+        )
+
+        column_mapping = get_column_mapping(
+            self.settings.input_file, self.output_filename
+        )
+
+        copy_dataframe_cells_to_excel_template(
+            filename=self.output_filename,
+            template_filename=os.path.abspath(self.settings.input_file),
+            column_mapping=column_mapping,
+            engine=self.settings.output_engine,
+        )
+
+        return self.output_filename
+
+
+def save_output(
+    settings: Settings,
+    html_sources: list[str],
+    modified_htmls: list[str],
+    output_directory: str = os.path.join("output", TODAY_DATE),
+) -> str:
+    output = OutputWriter(settings, output_directory)
+    output.write_rows(html_sources, modified_htmls)
+    return output.save()
+
+
+async def enhance(
+    settings: Settings,
+    output_directory: str = os.path.join("output", TODAY_DATE),
+    temp_directory: str = os.path.join("temp", TODAY_DATE),
+):
+    """
+    Streams the rows of the input file through the styling pipeline into the output file
+
+    Reading, styling and writing the rows overlap, only copying them into the template waits for the last row.
+    """
+    logger.log("ACTION", f"Reading <blue>{settings.input_file}</> ...")
+
+    output = OutputWriter(settings, output_directory)
+
+    await style_rows(
+        settings,
+        iter_html_sources(settings),
+        temp_directory=temp_directory,
+        on_rows=output.write_rows,
     )
 
+    output_filename = await asyncio.to_thread(output.save)
+
     logger.success(f"File saved to <CYAN><white>{output_filename}</></>")
@@ -10,6 +10,8 @@ from excelsheet import col_to_excel
 from excelsheet import write_to_excel_template_cell_openpyxl
 from openpyxl import load_workbook
 
+from html_style_enhancer.xlsx import copy_to_xlsx_template
+
 
 @dataclass(slots=True, frozen=True)
 class ExcelColumn:
@@ -117,6 +119,7 @@ def copy_dataframe_cells_to_excel_template(
     template_filename: str,
     column_mapping: dict[int, ExcelColumn],
     current_os: str = "Windows",
+    engine: str = "openpyxl",
 ):
     """
     Copies data from a DataFrame (loaded from a CSV or Excel file) into an Excel template.
@@ -125,8 +128,10 @@ def copy_dataframe_cells_to_excel_template(
         template_filename (str): Absolute path to the Excel template file.
         column_mapping (dict[int, ExcelColumn]): Mapping from DataFrame column indices to Excel columns.
         current_os (str, optional): Operating system name, defaults to "Windows".
+        engine (str, optional): "openpyxl" to load and save the template as a workbook, or "zip" to patch the xlsx archive directly, defaults to "openpyxl".
     Raises:
         OSError: If the template_filename is not an absolute path on Windows.
+        ValueError: If the engine is not supported.
     """
     if not os.path.isabs(template_filename) and current_os == "Windows":
         raise OSError(f"Absolute path is needed for win32com (got {template_filename})")
@@ -136,9 +141,19 @@ def copy_dataframe_cells_to_excel_template(
     else:
         dataframe = pd.read_csv(filename, encoding="utf-8-sig", dtype="str")
 
-    copy_to_openpyxl_template(
-        dataframe=dataframe,
-        filename=filename,
-        template_filename=template_filename,
-        column_mapping=column_mapping,
-    )
+    if engine == "openpyxl":
+        copy_to_openpyxl_template(
+            dataframe=dataframe,
+            filename=filename,
+            template_filename=template_filename,
+            column_mapping=column_mapping,
+        )
+    elif engine == "zip":
+        copy_to_xlsx_template(
+            dataframe=dataframe,
+            filename=filename,
+            template_filename=template_filename,
+            column_mapping=column_mapping,
+        )
+    else:
+        raise ValueError(f"Unsupported output engine: {engine}")
@@ -29,6 +29,9 @@ if TYPE_CHECKING:
 WINDOW_WIDTH = 840
 WINDOW_HEIGHT = 800
 
+# ? Korean font is loaded once the window is already on screen (with the default font)
+FONT_LOAD_FRAME = 2
+
 
 @dataclass(slots=True, kw_only=True)
 class Configuration:
@@ -44,6 +47,10 @@ class Configuration:
     test_mode: bool
     html_source_column: str
     html_source_modified_column: str
+    queue_size: int
+    workers: int
+    output_engine: str
+    on_error: str
 
 
 class ElementTag(IntEnum):
@@ -111,7 +118,7 @@ class GUI:
         except (ValueError, TypeError):
             dpg.set_value(ElementTag.STYLING_PREVIEW, "Invalid settings")
 
-    def create(self, font: str):
+    def create(self):
         if not os.path.exists(self.configuration.input_file):
             self.configuration.input_file = glob("INPUT_*.xlsx")[0]
 
@@ -208,8 +215,6 @@ class GUI:
             user_data=self,
         )
 
-        dpg.bind_font(font)
-
 
 async def run(settings: Settings) -> None:
     logger.remove()
@@ -250,12 +255,26 @@ async def run(settings: Settings) -> None:
         test_mode=settings.test_mode,
         html_source_column=settings.html_source_column,
         html_source_modified_column=settings.html_source_modified_column,
+        queue_size=settings.queue_size,
+        workers=settings.workers,
+        output_engine=settings.output_engine,
+        on_error=settings.on_error,
     )
-    gui = GUI(configuration)
     logger.info(f"Today's date: <blue>{configuration.today_date}</blue>")
 
-    dpg.create_context()
+    setup(configuration)
+
+    dpg.start_dearpygui()
+    dpg.destroy_context()
+
+
+def load_font():
+    """
+    Loads the Korean font and binds it to every element
 
+    Rasterizing the (large) Korean glyph ranges into the font atlas is what made the window appear slowly,
+    so this is called from a frame callback after the window has been shown with the default font.
+    """
     font: Any
     with dpg.font_registry(tag="korean"):
         with dpg.font("NanumBarunGothic.otf", 18) as font:  # type: ignore
@@ -265,8 +284,19 @@ async def run(settings: Settings) -> None:
             dpg.add_font_chars([0x3105, 0x3107, 0x3108])
             dpg.add_char_remap(0x3084, 0x0025)
 
+    dpg.bind_font(font)
+
+
+def setup(configuration: Configuration) -> GUI:
+    """
+    Creates the window and shows the viewport, the Korean font is loaded on frame FONT_LOAD_FRAME
+    """
+    gui = GUI(configuration)
+
+    dpg.create_context()
+
     with dpg.window(tag="Primary Window", autosize=True):
-        gui.create(font)  # type: ignore
+        gui.create()
 
     dpg.create_viewport(
         title="HTML Style Enhancer",
@@ -279,8 +309,9 @@ async def run(settings: Settings) -> None:
     dpg.show_viewport()
 
     dpg.set_primary_window("Primary Window", True)
-    dpg.start_dearpygui()
-    dpg.destroy_context()
+    dpg.set_frame_callback(FONT_LOAD_FRAME, load_font)
+
+    return gui
 
 
 def proceed_callback(sender: Any, app_data: Any, stateful: StatefulData):
@@ -312,6 +343,10 @@ def proceed_callback(sender: Any, app_data: Any, stateful: StatefulData):
         background_image=background_image,
         html_source_column=stateful.configuration.html_source_column,
         html_source_modified_column=stateful.configuration.html_source_modified_column,
+        queue_size=stateful.configuration.queue_size,
+        workers=stateful.configuration.workers,
+        output_engine=stateful.configuration.output_engine,
+        on_error=stateful.configuration.on_error,
     )
 
     asyncio.run(enhance(settings))
@@ -7,6 +7,9 @@ from typing import TYPE_CHECKING
 from html_style_enhancer.enhance import enhance
 from html_style_enhancer.log import LOGGER_FORMAT_STR
 from html_style_enhancer.log import logger
+from html_style_enhancer.shard import enhance_shard
+from html_style_enhancer.shard import merge
+from html_style_enhancer.watch import watch
 
 
 if TYPE_CHECKING:
@@ -39,4 +42,11 @@ async def run(settings: Settings):
         level="DEBUG",
     )
 
-    await enhance(settings)
+    if settings.watch_directory:
+        await watch(settings, settings.watch_directory)
+    elif settings.merge_files:
+        await merge(settings, settings.merge_files)
+    elif settings.shard:
+        await enhance_shard(settings, *settings.shard)
+    else:
+        await enhance(settings)
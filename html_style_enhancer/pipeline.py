@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from functools import cache
+from functools import partial
+from typing import TYPE_CHECKING
+from typing import Any
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Iterator
+    from collections.abc import Sequence
+    from typing import Final
+
+    from html_style_enhancer.settings import Settings
+
+# ? Marks the end of the stream, each consumer of a queue receives exactly one
+SENTINEL: Final[None] = None
+
+QUEUE_MONITOR_INTERVAL: Final[float] = 1.0
+
+# ? Rows sent to a worker process at once, so that the IPC cost is paid once per batch instead of once per row
+PIPELINE_BATCH_SIZE: Final[int] = 64
+
+
+@cache
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the process pool shared by every run in this process, so that the worker processes are only started once
+    """
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+@dataclass(slots=True)
+class StageStats:
+    name: str
+    maxsize: int
+    max_depth: int = 0
+    total_depth: int = 0
+    samples: int = 0
+
+    def sample(self, depth: int):
+        self.max_depth = max(self.max_depth, depth)
+        self.total_depth += depth
+        self.samples += 1
+
+    @property
+    def average_depth(self) -> float:
+        return self.total_depth / self.samples if self.samples else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.name} queue: avg {self.average_depth:.1f}, max {self.max_depth}/{self.maxsize}"
+
+
+@dataclass(slots=True)
+class PipelineStats:
+    stages: list[StageStats] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return " | ".join(str(stage) for stage in self.stages)
+
+
+@dataclass(slots=True)
+class PipelineResult:
+    html_sources: list[str] = field(default_factory=list)
+    modified_htmls: list[str] = field(default_factory=list)
+    # ? Problem of each row that couldn't be transformed, keyed by row number
+    problems: dict[int, str] = field(default_factory=dict)
+    # ? Rows kept as they are because they didn't need the transform
+    skipped: int = 0
+    stats: PipelineStats = field(default_factory=PipelineStats)
+
+
+def batched(
+    html_sources: Sequence[str], size: int = PIPELINE_BATCH_SIZE
+) -> Iterator[list[str]]:
+    return (
+        list(html_sources[start : start + size])
+        for start in range(0, len(html_sources), size)
+    )
+
+
+def transform_batch(
+    transform: Callable[[str], tuple[str, str | None]], html_sources: list[str]
+) -> list[tuple[str, str | None]]:
+    return [transform(html_source) for html_source in html_sources]
+
+
+def save_batch(
+    temp_directory: str,
+    transformed_htmls: dict[int, str],
+    html_sources: list[str],
+    modified_htmls: list[str],
+    on_rows: Callable[[list[str], list[str]], None] | None,
+):
+    for idx, modified_html in transformed_htmls.items():
+        with open(
+            os.path.join(temp_directory, f"html_{idx}.html"), "w", encoding="utf-8"
+        ) as f:
+            f.write(modified_html)
+
+    if on_rows is not None:
+        on_rows(html_sources, modified_htmls)
+
+
+async def read_stage(
+    html_chunks: Iterator[list[str]],
+    read_queue: asyncio.Queue[tuple[int, list[str]] | None],
+    workers: int,
+    first_row: int,
+):
+    idx = first_row
+
+    # ? Each chunk is read in a thread, so that reading the next chunk overlaps with styling the previous ones
+    while chunk := await asyncio.to_thread(next, html_chunks, []):
+        await read_queue.put((idx, chunk))
+        idx += len(chunk)
+
+    for _ in range(workers):
+        await read_queue.put(SENTINEL)
+
+
+async def styling_stage(
+    read_queue: asyncio.Queue[tuple[int, list[str]] | None],
+    write_queue: asyncio.Queue[
+        tuple[int, list[str], list[tuple[str, str | None] | None]] | None
+    ],
+    executor: ProcessPoolExecutor,
+    transform: Callable[[str], tuple[str, str | None]],
+    skip: Callable[[str], bool] | None,
+):
+    loop = asyncio.get_running_loop()
+
+    while (item := await read_queue.get()) is not SENTINEL:
+        idx, html_sources = item
+
+        # ? Skipped rows are kept as they are, without a round trip to the process pool
+        skipped = [
+            skip is not None and skip(html_source) for html_source in html_sources
+        ]
+        pending = [
+            html_source
+            for html_source, is_skipped in zip(html_sources, skipped)
+            if not is_skipped
+        ]
+
+        results = iter(
+            await loop.run_in_executor(
+                executor, partial(transform_batch, transform, pending)
+            )
+            if pending
+            else []
+        )
+        transformed = [None if is_skipped else next(results) for is_skipped in skipped]
+
+        await write_queue.put((idx, html_sources, transformed))
+
+    await write_queue.put(SENTINEL)
+
+
+async def write_stage(
+    write_queue: asyncio.Queue[
+        tuple[int, list[str], list[tuple[str, str | None] | None]] | None
+    ],
+    result: PipelineResult,
+    temp_directory: str,
+    workers: int,
+    first_row: int,
+    on_rows: Callable[[list[str], list[str]], None] | None,
+):
+    finished_workers = 0
+    next_row = first_row
+    pending: dict[int, tuple[list[str], list[tuple[str, str | None] | None]]] = {}
+
+    while finished_workers < workers:
+        item = await write_queue.get()
+        if item is SENTINEL:
+            finished_workers += 1
+            continue
+
+        idx, html_sources, transformed = item
+        pending[idx] = (html_sources, transformed)
+
+        # ? Batches finish out of order, they are saved in the order of the input file
+        while next_row in pending:
+            html_sources, transformed = pending.pop(next_row)
+            modified_htmls: list[str] = []
+            transformed_htmls: dict[int, str] = {}
+
+            for idx, (html_source, row) in enumerate(
+                zip(html_sources, transformed), start=next_row
+            ):
+                if row is None:
+                    result.skipped += 1
+                    modified_htmls.append(html_source)
+                    continue
+
+                modified_html, problem = row
+                modified_htmls.append(modified_html)
+                transformed_htmls[idx] = modified_html
+                if problem is not None:
+                    result.problems[idx] = problem
+
+            result.html_sources.extend(html_sources)
+            result.modified_htmls.extend(modified_htmls)
+
+            await asyncio.to_thread(
+                save_batch,
+                temp_directory,
+                transformed_htmls,
+                html_sources,
+                modified_htmls,
+                on_rows,
+            )
+            next_row += len(html_sources)
+
+
+async def monitor_queues(queues: dict[str, asyncio.Queue[Any]], stats: PipelineStats):
+    # ? Only sampled, the summary is logged once at the end of the run
+    while True:
+        for stage, queue in zip(stats.stages, queues.values()):
+            stage.sample(queue.qsize())
+
+        await asyncio.sleep(QUEUE_MONITOR_INTERVAL)
+
+
+async def run_pipeline(
+    settings: Settings,
+    html_chunks: Iterator[list[str]],
+    transform: Callable[[str], tuple[str, str | None]],
+    temp_directory: str,
+    first_row: int = 1,
+    on_rows: Callable[[list[str], list[str]], None] | None = None,
+    skip: Callable[[str], bool] | None = None,
+) -> PipelineResult:
+    """
+    Runs the transform over every html source through a reader -> styling -> writer pipeline.
+
+    The reader pulls the chunks of html sources in a thread (e.g., streamed from the input file), the transform runs
+    over each chunk in a process pool, and the writer saves the finished rows to the temp directory and passes them to
+    on_rows in a thread, in the order of the input file. So reading the next chunk and writing the previous one overlap
+    with the CPU-bound styling. The stages are connected by bounded queues (of settings.queue_size chunks) so that a slow
+    stage applies backpressure to the previous one.
+
+    The transform returns the transformed html and the problem found in the row (None if there was none). Rows for
+    which skip returns True are kept as they are, they are neither sent to the process pool nor written to the temp
+    directory.
+    Rows are numbered from first_row (the 1-based index of the first html source in the input file) in the temp
+    directory and in the problems of the result.
+    """
+    workers = settings.workers
+    read_queue: asyncio.Queue[tuple[int, list[str]] | None] = asyncio.Queue(
+        maxsize=settings.queue_size
+    )
+    write_queue: asyncio.Queue[
+        tuple[int, list[str], list[tuple[str, str | None] | None]] | None
+    ] = asyncio.Queue(maxsize=settings.queue_size)
+    queues: dict[str, asyncio.Queue[Any]] = {"read": read_queue, "write": write_queue}
+    result = PipelineResult(
+        stats=PipelineStats(
+            [StageStats(name, queue.maxsize) for name, queue in queues.items()]
+        )
+    )
+
+    os.makedirs(temp_directory, exist_ok=True)
+
+    executor = get_executor(workers)
+
+    monitor = asyncio.create_task(monitor_queues(queues, result.stats))
+    tasks = [
+        asyncio.create_task(read_stage(html_chunks, read_queue, workers, first_row)),
+        *(
+            asyncio.create_task(
+                styling_stage(read_queue, write_queue, executor, transform, skip)
+            )
+            for _ in range(workers)
+        ),
+        asyncio.create_task(
+            write_stage(
+                write_queue, result, temp_directory, workers, first_row, on_rows
+            )
+        ),
+    ]
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in [*tasks, monitor]:
+            task.cancel()
+        await asyncio.gather(*tasks, monitor, return_exceptions=True)
+
+    return result
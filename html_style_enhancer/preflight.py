@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import asyncio
+import re
+
+from dataclasses import dataclass
+from functools import cache
+from functools import partial
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING
+
+import soupsieve
+
+from bs4 import BeautifulSoup
+from bs4 import Tag
+
+from html_style_enhancer.log import logger
+from html_style_enhancer.pipeline import get_executor
+
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from typing import Final
+
+    from html_style_enhancer.settings import Settings
+
+ON_ERROR_CHOICES: Final[tuple[str, ...]] = ("fail", "skip", "keep-original")
+
+PREFLIGHT_CHUNK_SIZE: Final[int] = 256
+
+# ? Elements that can't have children, BeautifulSoup closes them right away
+VOID_ELEMENTS: Final[frozenset[str]] = frozenset(
+    [
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "param",
+        "source",
+        "track",
+        "wbr",
+    ]
+)
+
+IDENTIFIER: Final[str] = r"-?[A-Za-z_][\w-]*"
+
+# ? Compound selector made of an optional type selector followed by .class, #id, [attribute] or [attribute=value]
+SIMPLE_SELECTOR_RE: Final[re.Pattern[str]] = re.compile(
+    rf"""(?P<tag>{IDENTIFIER}|\*)?(?P<parts>(?:\.{IDENTIFIER}|#{IDENTIFIER}|\[\s*{IDENTIFIER}\s*(?:=\s*(?:"[^"]*"|'[^']*'|{IDENTIFIER})\s*)?\])*)"""
+)
+SELECTOR_PART_RE: Final[re.Pattern[str]] = re.compile(
+    rf"""\.(?P<class_name>{IDENTIFIER})|#(?P<id>{IDENTIFIER})|\[\s*(?P<name>{IDENTIFIER})\s*(?:=\s*(?:"(?P<double>[^"]*)"|'(?P<single>[^']*)'|(?P<bare>{IDENTIFIER}))\s*)?\]"""
+)
+
+
+@cache
+def compile_selector(selector: str) -> soupsieve.SoupSieve:
+    return soupsieve.compile(selector)
+
+
+def find_styled_element(document: BeautifulSoup, selector: str) -> Tag:
+    """
+    Finds the element to style and checks that it (and its children) can be styled
+
+    Will throw ValueError describing the first structural problem found
+    """
+    tag = compile_selector(selector).select_one(document)
+    if not tag:
+        raise ValueError(f"Element not found in html using selector: {selector}")
+
+    if "style" not in tag.attrs:
+        raise ValueError(f"Element '{tag.name}' has no style attribute")
+
+    for children in tag.children:
+        if isinstance(children, Tag):
+            if "style" not in children.attrs:
+                raise ValueError(
+                    f"Child element '{children.name}' has no style attribute"
+                )
+        elif children.strip():
+            raise ValueError(
+                f"Child text is not wrapped in an element: '{children.strip()[:30]}'"
+            )
+
+    return tag
+
+
+@dataclass(slots=True, frozen=True)
+class SimpleSelector:
+    text: str
+    tag: str | None
+    classes: tuple[str, ...]
+    attributes: tuple[tuple[str, str | None], ...]
+
+    def matches(self, tag: str, attributes: dict[str, str | None]) -> bool:
+        if self.tag is not None and self.tag != tag:
+            return False
+
+        if self.classes:
+            classes = (attributes.get("class") or "").split()
+            if any(class_name not in classes for class_name in self.classes):
+                return False
+
+        for name, value in self.attributes:
+            if name not in attributes:
+                return False
+            if value is not None and (attributes[name] or "") != value:
+                return False
+
+        return True
+
+
+@cache
+def parse_simple_selector(selector: str) -> SimpleSelector | None:
+    """
+    Parses a selector that can be matched while streaming the html (e.g., div, div.product, #detail, div[data-id="1"])
+
+    Returns None for anything else (combinators, selector lists, pseudo-classes, ...), which is matched with BeautifulSoup instead
+    """
+    match = SIMPLE_SELECTOR_RE.fullmatch(selector.strip())
+    if not match or not selector.strip():
+        return None
+
+    tag = match.group("tag")
+    classes: list[str] = []
+    attributes: list[tuple[str, str | None]] = []
+
+    for part in SELECTOR_PART_RE.finditer(match.group("parts")):
+        if part.group("class_name"):
+            classes.append(part.group("class_name"))
+        elif part.group("id"):
+            attributes.append(("id", part.group("id")))
+        else:
+            value = next(
+                (
+                    value
+                    for value in part.group("double", "single", "bare")
+                    if value is not None
+                ),
+                None,
+            )
+            attributes.append((part.group("name").lower(), value))
+
+    return SimpleSelector(
+        text=selector,
+        tag=None if tag in (None, "*") else tag.lower(),
+        classes=tuple(classes),
+        attributes=tuple(attributes),
+    )
+
+
+class StopScanning(Exception):
+    pass
+
+
+class StyledElementScanner(HTMLParser):
+    """
+    Streams the html up to the first element matched by a simple selector and checks it like find_styled_element does,
+    without building the document tree. Parsing stops as soon as the matched element is closed or a problem is found.
+    """
+
+    def __init__(self, selector: SimpleSelector):
+        super().__init__(convert_charrefs=True)
+        self.selector = selector
+        self.open_tags: list[str] = []
+        # ? Position of the matched element in open_tags
+        self.depth: int | None = None
+        self.found = False
+
+    @property
+    def in_direct_children(self) -> bool:
+        return self.depth is not None and len(self.open_tags) == self.depth + 1
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        attributes = dict(attrs)
+
+        if self.depth is None:
+            if self.selector.matches(tag, attributes):
+                self.found = True
+                if "style" not in attributes:
+                    raise ValueError(f"Element '{tag}' has no style attribute")
+                if tag in VOID_ELEMENTS:
+                    raise StopScanning
+                self.depth = len(self.open_tags)
+        elif self.in_direct_children and "style" not in attributes:
+            raise ValueError(f"Child element '{tag}' has no style attribute")
+
+        if tag not in VOID_ELEMENTS:
+            self.open_tags.append(tag)
+
+    def handle_endtag(self, tag: str):
+        # ? Like BeautifulSoup, closes every element opened after the most recent one with the same name
+        for idx in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[idx] == tag:
+                del self.open_tags[idx:]
+                break
+
+        if self.depth is not None and len(self.open_tags) <= self.depth:
+            raise StopScanning
+
+    def handle_data(self, data: str):
+        if self.in_direct_children and data.strip():
+            raise ValueError(
+                f"Child text is not wrapped in an element: '{data.strip()[:30]}'"
+            )
+
+    # ? BeautifulSoup keeps comments, declarations, CDATA and processing instructions as strings, so they are text too
+
+    def handle_comment(self, data: str):
+        self.handle_data(data)
+
+    def handle_decl(self, decl: str):
+        # ? BeautifulSoup drops the "DOCTYPE " prefix
+        self.handle_data(decl[len("DOCTYPE ") :])
+
+    def unknown_decl(self, data: str):
+        if data.upper().startswith("CDATA["):
+            data = data[len("CDATA[") :]
+        self.handle_data(data)
+
+    def handle_pi(self, data: str):
+        self.handle_data(data)
+
+    def scan(self, html_source: str):
+        """
+        Will throw ValueError describing the first structural problem found
+        """
+        try:
+            self.feed(html_source)
+            self.close()
+        except StopScanning:
+            return
+
+        if not self.found:
+            raise ValueError(
+                f"Element not found in html using selector: {self.selector.text}"
+            )
+
+
+def escape_markup(text: str) -> str:
+    return text.replace("<", r"\<")
+
+
+def check_html(html_source: str, *, selector: str) -> str | None:
+    """
+    Returns the problem which prevents styling the html, None if it can be styled
+
+    Simple selectors are matched by streaming the html, anything else by parsing it with BeautifulSoup
+    """
+    simple_selector = parse_simple_selector(selector)
+
+    try:
+        if simple_selector is None:
+            find_styled_element(BeautifulSoup(html_source, "html.parser"), selector)
+        else:
+            StyledElementScanner(simple_selector).scan(html_source)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def report_problems(problems: dict[int, str]):
+    # ? Header is the first row of the sheet
+    for idx, problem in problems.items():
+        logger.warning(f"Row <blue>{idx + 1}</>: {escape_markup(problem)}")
+
+
+def check_rows(html_sources: Sequence[str], selector: str) -> list[str | None]:
+    return [check_html(html_source, selector=selector) for html_source in html_sources]
+
+
+async def preflight(
+    settings: Settings,
+    html_sources: Sequence[str],
+    first_row: int = 1,
+    marker: str | None = None,
+) -> dict[int, str]:
+    """
+    Checks every row before the styling pass, so that a bad row is reported in seconds instead of after hours of work.
+
+    Rows are checked in chunks in a process pool. A simple selector is matched while streaming the html, which stops as soon
+    as the matched element is closed, other selectors are matched on a BeautifulSoup document. Nothing is modified or
+    serialized. Rows containing the marker (already enhanced) are not sent to the process pool at all.
+
+    Returns the problem of each offending row keyed by its (1-based) index in the input file, html_sources[0] being first_row.
+    Will throw ValueError listing every offending row if settings.on_error is "fail".
+    """
+    loop = asyncio.get_running_loop()
+
+    rows = [
+        idx
+        for idx, html_source in enumerate(html_sources, start=first_row)
+        if not (marker and marker in html_source)
+    ]
+
+    executor = get_executor(settings.workers)
+    chunks = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor,
+                partial(
+                    check_rows,
+                    [
+                        html_sources[idx - first_row]
+                        for idx in rows[start : start + PREFLIGHT_CHUNK_SIZE]
+                    ],
+                    settings.selector,
+                ),
+            )
+            for start in range(0, len(rows), PREFLIGHT_CHUNK_SIZE)
+        )
+    )
+
+    problems: dict[int, str] = {
+        idx: problem
+        for idx, problem in zip(
+            rows, (problem for chunk in chunks for problem in chunk)
+        )
+        if problem is not None
+    }
+
+    report_problems(problems)
+
+    if problems and settings.on_error == "fail":
+        raise ValueError(
+            f"{len(problems)} row(s) can't be styled: {', '.join(str(idx + 1) for idx in problems)} (use --on_error skip or keep-original to process the rest)"
+        )
+
+    return problems
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import os
+
 from dataclasses import dataclass
 
 
@@ -16,3 +18,12 @@ class Settings:
     background_image: str
     html_source_column: str
     html_source_modified_column: str
+    queue_size: int = 8
+    workers: int = os.cpu_count() or 1
+    output_engine: str = "openpyxl"
+    on_error: str = "fail"
+    shard: tuple[int, int] | None = None
+    merge_files: tuple[str, ...] = ()
+    watch_directory: str | None = None
+    watch_interval: float = 2.0
+    watch_concurrency: int = 1
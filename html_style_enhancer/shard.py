@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from argparse import ArgumentTypeError
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from html_style_enhancer.enhance import TODAY_DATE
+from html_style_enhancer.enhance import generate_styling
+from html_style_enhancer.enhance import get_html_sources
+from html_style_enhancer.enhance import save_output
+from html_style_enhancer.enhance import style_rows
+from html_style_enhancer.log import logger
+from html_style_enhancer.pipeline import batched
+
+
+if TYPE_CHECKING:
+    from typing import Any
+    from typing import Final
+
+    from html_style_enhancer.settings import Settings
+
+SHARD_RE: Final = re.compile(r"^(\d+)/(\d+)$")
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+    """
+    Parses "i/N" (e.g., "2/4" is the second of four shards)
+
+    Will throw ArgumentTypeError if the text is not in this format or i is not between 1 and N
+    """
+    match = SHARD_RE.match(text.strip())
+    if not match:
+        raise ArgumentTypeError(f"Shard must be in the format i/N (got '{text}')")
+
+    shard, shards = int(match.group(1)), int(match.group(2))
+    if not 1 <= shard <= shards:
+        raise ArgumentTypeError(
+            f"Shard number must be between 1 and {shards} (got {shard})"
+        )
+
+    return shard, shards
+
+
+def shard_range(rows: int, shard: int, shards: int) -> range:
+    """
+    Returns the 0-based range of rows processed by the shard, the ranges of all shards cover every row exactly once
+    """
+    return range(rows * (shard - 1) // shards, rows * shard // shards)
+
+
+def file_digest(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def profile_digest(settings: Settings) -> str:
+    """
+    Hash of everything that changes the styled html, shards can only be merged if it is the same for all of them
+    """
+    profile = "\n".join(
+        [
+            settings.selector,
+            generate_styling(settings),
+            settings.on_error,
+            settings.html_source_column,
+            settings.html_source_modified_column,
+        ]
+    )
+    return hashlib.sha256(profile.encode("utf-8")).hexdigest()
+
+
+def shard_filename(settings: Settings, shard: int, shards: int) -> str:
+    return os.path.join(
+        "output",
+        TODAY_DATE,
+        f"{Path(settings.output_file).stem}.shard-{shard}-of-{shards}.json.gz",
+    )
+
+
+async def enhance_shard(settings: Settings, shard: int, shards: int):
+    logger.log(
+        "ACTION",
+        f"Reading <blue>{settings.input_file}</> (shard <blue>{shard}/{shards}</>) ...",
+    )
+
+    html_sources = get_html_sources(settings)
+    rows = shard_range(len(html_sources), shard, shards)
+
+    logger.info(f"Processing rows <blue>{rows.start + 1}</> to <blue>{rows.stop}</>")
+
+    modified_htmls = await style_rows(
+        settings, batched(html_sources[rows.start : rows.stop]), rows.start + 1
+    )
+
+    partial_result: dict[str, Any] = {
+        "shard": shard,
+        "shards": shards,
+        "start": rows.start,
+        "rows": len(html_sources),
+        "input_digest": file_digest(settings.input_file),
+        "profile_digest": profile_digest(settings),
+        "modified_htmls": modified_htmls,
+    }
+
+    filename = shard_filename(settings, shard, shards)
+    with gzip.open(filename, "wt", encoding="utf-8") as f:
+        json.dump(partial_result, f, ensure_ascii=False)
+
+    logger.success(f"Shard saved to <CYAN><white>{filename}</></>")
+
+
+def load_shards(
+    settings: Settings, shard_files: tuple[str, ...], rows: int
+) -> list[str]:
+    """
+    Loads the partial results and assembles the modified html of every row in the input file
+
+    Will throw ValueError if the shards don't belong to this input file and styling profile, or don't cover every row
+    """
+    input_digest = file_digest(settings.input_file)
+    expected_profile = profile_digest(settings)
+
+    partial_results: dict[int, dict[str, Any]] = {}
+    shards: int | None = None
+
+    for shard_file in shard_files:
+        with gzip.open(shard_file, "rt", encoding="utf-8") as f:
+            partial_result: dict[str, Any] = json.load(f)
+
+        name = os.path.basename(shard_file)
+        if partial_result["input_digest"] != input_digest:
+            raise ValueError(f'"{name}" was not created from "{settings.input_file}"')
+        if partial_result["profile_digest"] != expected_profile:
+            raise ValueError(f'"{name}" was created with different styling settings')
+        if shards is not None and partial_result["shards"] != shards:
+            raise ValueError(f'"{name}" belongs to a different number of shards')
+        if partial_result["shard"] in partial_results:
+            raise ValueError(f'Shard {partial_result["shard"]} is given more than once')
+
+        shards = partial_result["shards"]
+        partial_results[partial_result["shard"]] = partial_result
+
+    if shards is None:
+        raise ValueError("No shard is given to merge")
+
+    missing = [shard for shard in range(1, shards + 1) if shard not in partial_results]
+    if missing:
+        raise ValueError(f"Shard(s) {', '.join(map(str, missing))} of {shards} missing")
+
+    modified_htmls: list[str] = []
+    for shard in range(1, shards + 1):
+        partial_result = partial_results[shard]
+        expected_rows = shard_range(rows, shard, shards)
+        if partial_result["start"] != expected_rows.start or len(
+            partial_result["modified_htmls"]
+        ) != len(expected_rows):
+            raise ValueError(f"Shard {shard} doesn't match the rows of the input file")
+        modified_htmls.extend(partial_result["modified_htmls"])
+
+    return modified_htmls
+
+
+async def merge(settings: Settings, shard_files: tuple[str, ...]):
+    logger.log("ACTION", f"Merging <blue>{len(shard_files)}</> shard(s) ...")
+
+    html_sources = get_html_sources(settings)
+    modified_htmls = load_shards(settings, shard_files, len(html_sources))
+
+    output_filename = save_output(settings, html_sources, modified_htmls)
+
+    logger.success(f"File saved to <CYAN><white>{output_filename}</></>")
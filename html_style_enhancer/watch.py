@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import os
+import zipfile
+
+from datetime import datetime
+from functools import partial
+from glob import glob
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from html_style_enhancer.enhance import enhance
+from html_style_enhancer.enhance import generate_styling
+from html_style_enhancer.enhance import style_html
+from html_style_enhancer.log import logger
+from html_style_enhancer.pipeline import get_executor
+from html_style_enhancer.shard import file_digest
+from html_style_enhancer.shard import profile_digest
+
+
+if TYPE_CHECKING:
+    from typing import Final
+
+    from html_style_enhancer.settings import Settings
+
+PROCESSED_HASHES_FILE: Final[str] = os.path.join("output", "processed_hashes.txt")
+
+
+def load_processed_hashes() -> set[str]:
+    if not os.path.exists(PROCESSED_HASHES_FILE):
+        return set()
+
+    with open(PROCESSED_HASHES_FILE, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def save_processed_hash(key: str):
+    os.makedirs(os.path.dirname(PROCESSED_HASHES_FILE), exist_ok=True)
+    with open(PROCESSED_HASHES_FILE, "a", encoding="utf-8") as f:
+        f.write(f"{key}\n")
+
+
+def processed_key(digest: str, settings: Settings) -> str:
+    """
+    Identifies a file processed with the styling settings, so that changing them processes the same file again
+    """
+    return f"{digest}:{profile_digest(settings)}"
+
+
+async def warm_up(settings: Settings):
+    """
+    Starts every worker process of the pool and imports the parsing modules in them before the first file arrives
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor(settings.workers)
+    await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor,
+                partial(
+                    style_html,
+                    "",
+                    selector=settings.selector,
+                    styling=generate_styling(settings),
+                    on_error="keep-original",
+                ),
+            )
+            for _ in range(settings.workers)
+        )
+    )
+
+
+def is_fully_written(path: str) -> bool:
+    # ? Central directory is at the end of the zip, so a partially copied xlsx is not a valid zip yet
+    return zipfile.is_zipfile(path)
+
+
+async def process_file(
+    settings: Settings,
+    path: str,
+    processed: set[str],
+    in_progress: set[str],
+):
+    digest = await asyncio.to_thread(file_digest, path)
+    key = processed_key(digest, settings)
+    name = Path(path).name
+
+    if key in processed:
+        logger.info(f"Skipping <blue>{name}</>, it has already been processed")
+        return
+    if key in in_progress:
+        logger.info(f"Skipping <blue>{name}</>, the same file is being processed")
+        return
+
+    in_progress.add(key)
+    try:
+        date = datetime.now().strftime("%Y%m%d")
+        output_directory = os.path.join("output", date)
+        os.makedirs(output_directory, exist_ok=True)
+
+        file_settings = dataclasses.replace(
+            settings,
+            input_file=path,
+            output_file=f"{Path(path).stem}_{digest[:8]}.xlsx",
+        )
+
+        # ? Reading and saving the workbook run in threads, the other files keep being processed meanwhile
+        await enhance(
+            file_settings,
+            output_directory,
+            os.path.join("temp", date, digest[:8]),
+        )
+    except Exception as err:
+        logger.error(f"Failed to process <blue>{name}</>: {err}")
+    else:
+        processed.add(key)
+        save_processed_hash(key)
+    finally:
+        in_progress.discard(key)
+
+
+async def process_queue(
+    settings: Settings,
+    queue: asyncio.Queue[str],
+    processed: set[str],
+    in_progress: set[str],
+):
+    while True:
+        path = await queue.get()
+        try:
+            await process_file(settings, path, processed, in_progress)
+        finally:
+            queue.task_done()
+
+
+async def watch(settings: Settings, directory: str):
+    """
+    Keeps enhancing the .xlsx files that are added to (or changed in) the directory into output/YYYYMMDD/.
+
+    The directory is polled every settings.watch_interval seconds. A file is only queued once its size and
+    modification time are the same on two consecutive polls and it is a complete zip archive, so that a file which
+    is still being copied is not picked up. Files whose content hash has already been processed with the same styling
+    settings (recorded in output/processed_hashes.txt across runs) are skipped. Up to settings.watch_concurrency files
+    are processed at the same time, sharing one warm process pool, while reading and saving the workbooks run in threads
+    so that they don't block the event loop.
+    """
+    logger.log("ACTION", f"Watching <blue>{directory}</> for new files ...")
+
+    await warm_up(settings)
+
+    processed = load_processed_hashes()
+    in_progress: set[str] = set()
+    queue: asyncio.Queue[str] = asyncio.Queue()
+
+    consumers = [
+        asyncio.create_task(process_queue(settings, queue, processed, in_progress))
+        for _ in range(settings.watch_concurrency)
+    ]
+
+    # ? (size, modification time) of each file on the previous poll, and when it was queued
+    observed: dict[str, tuple[int, int]] = {}
+    queued: dict[str, tuple[int, int]] = {}
+
+    try:
+        while True:
+            for path in glob(os.path.join(directory, "*.xlsx")):
+                # ? Lock file of an open workbook
+                if Path(path).name.startswith("~$"):
+                    continue
+
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                signature = (stat.st_size, stat.st_mtime_ns)
+                previous, observed[path] = observed.get(path), signature
+
+                if signature != previous or queued.get(path) == signature:
+                    continue
+                if not is_fully_written(path):
+                    continue
+
+                logger.info(f"Queueing <blue>{Path(path).name}</>")
+                queued[path] = signature
+                await queue.put(path)
+
+            await asyncio.sleep(settings.watch_interval)
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
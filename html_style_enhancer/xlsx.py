@@ -0,0 +1,596 @@
+from __future__ import annotations
+
+import posixpath
+import re
+import shutil
+import zipfile
+
+from itertools import chain
+from typing import IO
+from typing import TYPE_CHECKING
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+
+if TYPE_CHECKING:
+    from typing import Final
+
+    from html_style_enhancer.excel import ExcelColumn
+
+CHUNK_SIZE: Final[int] = 1024 * 1024
+
+NS_MAIN: Final[str] = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_RELATIONSHIPS: Final[
+    str
+] = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PACKAGE_RELATIONSHIPS: Final[
+    str
+] = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+SHARED_STRINGS_TYPE: Final[
+    str
+] = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+SHARED_STRINGS_CONTENT_TYPE: Final[
+    str
+] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+OFFICE_DOCUMENT_TYPE: Final[
+    str
+] = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+CALC_CHAIN_TYPE: Final[
+    str
+] = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain"
+
+# ? Same characters that openpyxl refuses to write into a cell
+ILLEGAL_CHARACTERS_RE: Final = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+# ? Elements may be written with a namespace prefix (e.g., <x:sheetData> by the OpenXML SDK)
+PREFIX: Final[bytes] = rb"(?:[A-Za-z_][\w.-]*:)?"
+
+SHEET_DATA_RE: Final = re.compile(rb"<(" + PREFIX + rb")sheetData\s*(/?)>")
+ROW_RE: Final = re.compile(
+    rb"<"
+    + PREFIX
+    + rb"row\b[^>]*?/>|<"
+    + PREFIX
+    + rb"row\b[^>]*>.*?</"
+    + PREFIX
+    + rb"row>",
+    re.DOTALL,
+)
+CELL_RE: Final = re.compile(
+    rb"<" + PREFIX + rb"c\b[^>]*?/>|<" + PREFIX + rb"c\b[^>]*>.*?</" + PREFIX + rb"c>",
+    re.DOTALL,
+)
+SST_RE: Final = re.compile(rb"<(" + PREFIX + rb")sst\b")
+OPEN_TAG_RE: Final = re.compile(rb"<[^>]*?>")
+ROW_NUMBER_RE: Final = re.compile(rb'\br="(\d+)"')
+CELL_REFERENCE_RE: Final = re.compile(rb'\br="([A-Z]+)\d+"')
+STYLE_RE: Final = re.compile(rb'\bs="\d+"')
+SPANS_RE: Final = re.compile(rb'\s+spans="[^"]*"')
+DIMENSION_RE: Final = re.compile(
+    rb"(<" + PREFIX + rb'dimension ref="[A-Z]+\d+:[A-Z]+)(\d+)("\s*/>)'
+)
+SST_START_TAG_RE: Final = re.compile(rb"<(" + PREFIX + rb")sst\b[^>]*>")
+SST_COUNT_RE: Final = re.compile(rb"""(\s)(count|uniqueCount)=(["'])(\d+)\3""")
+
+
+def excel_to_col(alphabet: str) -> int:
+    """
+    Converts Excel-style column letters to a 1-based column index (e.g., 'A' -> 1, 'AB' -> 28)
+    """
+    index = 0
+    for letter in alphabet:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index
+
+
+def count_occurrences(stream: IO[bytes], needles: tuple[bytes, ...]) -> int:
+    count = 0
+    overlap = max(len(needle) for needle in needles) - 1
+    tail = b""
+
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+        buffer = tail + chunk
+        # ? Only count matches that end inside the new chunk so that none is counted twice
+        count += sum(buffer.count(needle) - tail.count(needle) for needle in needles)
+        tail = buffer[-overlap:]
+
+    return count
+
+
+def resolve_target(base: str, target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def relationships_path(part: str) -> str:
+    return posixpath.join(
+        posixpath.dirname(part), "_rels", f"{posixpath.basename(part)}.rels"
+    )
+
+
+def find_workbook_parts(
+    archive: zipfile.ZipFile,
+) -> tuple[str, str, str | None, str | None]:
+    """
+    Finds the workbook, its active worksheet, its shared strings table and its calculation chain (if any) inside the xlsx archive
+    """
+    package_relationships = ElementTree.fromstring(archive.read("_rels/.rels"))
+    workbook = next(
+        resolve_target("", relationship.attrib["Target"])
+        for relationship in package_relationships.iter(
+            f"{{{NS_PACKAGE_RELATIONSHIPS}}}Relationship"
+        )
+        if relationship.attrib["Type"] == OFFICE_DOCUMENT_TYPE
+    )
+
+    workbook_relationships = {
+        relationship.attrib["Id"]: relationship.attrib
+        for relationship in ElementTree.fromstring(
+            archive.read(relationships_path(workbook))
+        ).iter(f"{{{NS_PACKAGE_RELATIONSHIPS}}}Relationship")
+    }
+
+    root = ElementTree.fromstring(archive.read(workbook))
+    workbook_view = root.find(f"{{{NS_MAIN}}}bookViews/{{{NS_MAIN}}}workbookView")
+    active_tab = (
+        int(workbook_view.attrib.get("activeTab", 0))
+        if workbook_view is not None
+        else 0
+    )
+    sheets = root.findall(f"{{{NS_MAIN}}}sheets/{{{NS_MAIN}}}sheet")
+    sheet_id = sheets[active_tab].attrib[f"{{{NS_RELATIONSHIPS}}}id"]
+    worksheet = resolve_target(workbook, workbook_relationships[sheet_id]["Target"])
+
+    shared_strings, calc_chain = (
+        next(
+            (
+                resolve_target(workbook, relationship["Target"])
+                for relationship in workbook_relationships.values()
+                if relationship["Type"] == relationship_type
+            ),
+            None,
+        )
+        for relationship_type in (SHARED_STRINGS_TYPE, CALC_CHAIN_TYPE)
+    )
+
+    return workbook, worksheet, shared_strings, calc_chain
+
+
+class SheetPatcher:
+    """
+    Rewrites the <sheetData> of a worksheet while it is streamed through, replacing the cells of the given columns.
+
+    Rows are only parsed (with regexes, not a full XML parser) between the last complete row of the previous chunk
+    and the last complete row of the current one, so the memory usage does not depend on the size of the worksheet.
+    Rows of the template beyond the data and cells of other columns are written back untouched.
+    """
+
+    def __init__(
+        self,
+        destination: IO[bytes],
+        columns: dict[int, bytes],
+        values: dict[int, list[int | None]],
+        rows: int,
+    ):
+        self.destination = destination
+        # ? Column index -> Excel column letters, values are indices in the shared strings table
+        self.columns = columns
+        self.values = values
+        self.first_row = 2
+        self.last_row = rows + 1
+
+        self.state = "head"
+        self.buffer = b""
+        self.previous_row = 0
+        # ? Namespace prefix of the elements, found on <sheetData>
+        self.prefix = b""
+
+    @property
+    def sheet_data_end(self) -> bytes:
+        return b"</%ssheetData>" % self.prefix
+
+    @property
+    def row_end(self) -> bytes:
+        return b"</%srow>" % self.prefix
+
+    def feed(self, chunk: bytes):
+        self.buffer += chunk
+
+        if self.state == "head":
+            self.process_head()
+        if self.state == "rows":
+            self.process_rows()
+        if self.state == "tail":
+            self.destination.write(self.buffer)
+            self.buffer = b""
+
+    def close(self):
+        """
+        Writes the rest of the worksheet
+
+        Will throw ValueError if the worksheet has no <sheetData> or it is not closed, as none of the values would be written
+        """
+        if self.state == "rows":
+            self.process_rows()
+        if self.state != "tail":
+            raise ValueError("Worksheet is truncated or has no <sheetData> element")
+
+        self.destination.write(self.buffer)
+        self.buffer = b""
+
+    def process_head(self):
+        match = SHEET_DATA_RE.search(self.buffer)
+        if not match:
+            return
+
+        head = DIMENSION_RE.sub(
+            lambda m: m.group(1)
+            + str(max(int(m.group(2)), self.last_row)).encode()
+            + m.group(3),
+            self.buffer[: match.start()],
+        )
+        self.destination.write(head)
+        self.buffer = self.buffer[match.end() :]
+        self.prefix = match.group(1)
+
+        if match.group(2):
+            self.destination.write(
+                b"<%ssheetData>" % self.prefix
+                + self.missing_rows(until=self.last_row + 1)
+                + self.sheet_data_end
+            )
+            self.state = "tail"
+        else:
+            self.destination.write(match.group(0))
+            self.state = "rows"
+
+    def process_rows(self):
+        end = self.buffer.find(self.sheet_data_end)
+        if end != -1:
+            self.destination.write(
+                ROW_RE.sub(self.patch_row, self.buffer[:end])
+                + self.missing_rows(until=self.last_row + 1)
+            )
+            self.buffer = self.buffer[end:]
+            self.state = "tail"
+            return
+
+        split = self.buffer.rfind(self.row_end)
+        if split == -1:
+            return
+
+        split += len(self.row_end)
+        self.destination.write(ROW_RE.sub(self.patch_row, self.buffer[:split]))
+        self.buffer = self.buffer[split:]
+
+    def missing_rows(self, *, until: int) -> bytes:
+        """
+        Creates the rows that are absent from the template but have data, up to (excluding) the given row
+        """
+        rows: list[bytes] = []
+        for row in range(
+            max(self.previous_row + 1, self.first_row), min(until, self.last_row + 1)
+        ):
+            cells = self.patch_cells(row, {})
+            if cells:
+                rows.append(
+                    b'<%srow r="%d">' % (self.prefix, row) + cells + self.row_end
+                )
+        self.previous_row = max(self.previous_row, until - 1)
+        return b"".join(rows)
+
+    def patch_row(self, match: re.Match[bytes]) -> bytes:
+        row_xml = match.group(0)
+        open_tag = OPEN_TAG_RE.match(row_xml).group(0)  # type: ignore
+        row_number = ROW_NUMBER_RE.search(open_tag)
+        row = int(row_number.group(1)) if row_number else self.previous_row + 1
+
+        missing_rows = self.missing_rows(until=row)
+        self.previous_row = row
+
+        if not self.first_row <= row <= self.last_row:
+            return missing_rows + row_xml
+
+        cells: dict[int, bytes] = {}
+        column = 0
+        for cell in CELL_RE.findall(row_xml[len(open_tag) :]):
+            reference = CELL_REFERENCE_RE.search(OPEN_TAG_RE.match(cell).group(0))  # type: ignore
+            column = (
+                excel_to_col(reference.group(1).decode()) if reference else column + 1
+            )
+            cells[column] = cell
+
+        if open_tag.endswith(b"/>"):
+            open_tag = open_tag[:-2].rstrip() + b">"
+
+        return (
+            missing_rows
+            + SPANS_RE.sub(b"", open_tag)
+            + self.patch_cells(row, cells)
+            + self.row_end
+        )
+
+    def patch_cells(self, row: int, cells: dict[int, bytes]) -> bytes:
+        cells = dict(cells)
+        for column, alphabet in self.columns.items():
+            original = cells.get(column)
+            style = b""
+            if original:
+                style_match = STYLE_RE.search(OPEN_TAG_RE.match(original).group(0))  # type: ignore
+                style = b" " + style_match.group(0) if style_match else b""
+
+            reference = alphabet + str(row).encode()
+            value = self.values[column][row - self.first_row]
+            prefix = self.prefix
+            if value is not None:
+                cells[column] = b'<%sc r="%s"%s t="s"><%sv>%d</%sv></%sc>' % (
+                    prefix,
+                    reference,
+                    style,
+                    prefix,
+                    value,
+                    prefix,
+                    prefix,
+                )
+            elif original:
+                cells[column] = b'<%sc r="%s"%s/>' % (prefix, reference, style)
+
+        return b"".join(cells[column] for column in sorted(cells))
+
+
+def shared_strings_prefix(stream: IO[bytes]) -> bytes:
+    """
+    Returns the namespace prefix of the <sst> element (e.g., b"x:"), or b"" if it has none
+    """
+    match = SST_RE.search(stream.read(4096))
+    return match.group(1) if match else b""
+
+
+def shared_string_item(text: str, prefix: bytes = b"") -> bytes:
+    text = escape(ILLEGAL_CHARACTERS_RE.sub("", text))
+    return b'<%ssi><%st xml:space="preserve">%s</%st></%ssi>' % (
+        prefix,
+        prefix,
+        text.encode("utf-8"),
+        prefix,
+        prefix,
+    )
+
+
+def patch_shared_strings_counts(
+    head: bytes, references: int, unique_strings: int
+) -> bytes:
+    """
+    Adds the new cell references to the count attribute and the new strings to the uniqueCount attribute of the <sst>
+    start tag (both are optional), the content of the table is left untouched
+    """
+    match = SST_START_TAG_RE.search(head)
+    if not match:
+        return head
+
+    added = {b"count": references, b"uniqueCount": unique_strings}
+    start_tag = SST_COUNT_RE.sub(
+        lambda m: b"%s%s=%s%d%s"
+        % (
+            m.group(1),
+            m.group(2),
+            m.group(3),
+            int(m.group(4)) + added[m.group(2)],
+            m.group(3),
+        ),
+        match.group(0),
+    )
+    return head[: match.start()] + start_tag + head[match.end() :]
+
+
+def append_shared_strings(
+    source: IO[bytes] | None,
+    destination: IO[bytes],
+    strings: list[str],
+    references: int,
+    prefix: bytes = b"",
+):
+    """
+    Appends the strings to the shared strings table (or writes a new one if there is no source), references being the
+    number of cells that use them
+    """
+    items = b"".join(shared_string_item(text, prefix) for text in strings)
+
+    if source is None:
+        destination.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<sst xmlns="%s" count="%d" uniqueCount="%d">'
+            % (NS_MAIN.encode(), references, len(strings))
+            + items
+            + b"</sst>"
+        )
+        return
+
+    # ? Read until the whole <sst> start tag is in the head
+    head = b""
+    while not SST_START_TAG_RE.search(head) and (chunk := source.read(CHUNK_SIZE)):
+        head += chunk
+
+    tail = b""
+    for chunk in chain(
+        [patch_shared_strings_counts(head, references, len(strings))],
+        iter(lambda: source.read(CHUNK_SIZE), b""),
+    ):
+        buffer = tail + chunk
+        # ? Keep enough bytes back to be sure that the closing tag is in the tail
+        destination.write(buffer[:-64])
+        tail = buffer[-64:]
+
+    end = tail.rfind(b"</%ssst>" % prefix)
+    if end != -1:
+        destination.write(tail[:end] + items + tail[end:])
+        return
+
+    end = tail.rfind(b"/>")
+    destination.write(
+        tail[:end] + b">" + items + b"</%ssst>" % prefix + tail[end + 2 :]
+    )
+
+
+def remove_calc_chain_part(
+    content_types: bytes, workbook_relationships: bytes, calc_chain: str
+) -> tuple[bytes, bytes]:
+    """
+    Unregisters the calculation chain, which would still list the formulas of the replaced cells. Excel rebuilds it,
+    like it does for a workbook saved by openpyxl (which drops it too)
+    """
+    content_types = re.sub(
+        rb'<Override\b[^>]*\bPartName="/%s"[^>]*/>' % re.escape(calc_chain.encode()),
+        b"",
+        content_types,
+    )
+    workbook_relationships = re.sub(
+        rb'<Relationship\b[^>]*\bType="%s"[^>]*/>'
+        % re.escape(CALC_CHAIN_TYPE.encode()),
+        b"",
+        workbook_relationships,
+    )
+
+    return content_types, workbook_relationships
+
+
+def add_shared_strings_part(
+    content_types: bytes, workbook_relationships: bytes, shared_strings: str
+) -> tuple[bytes, bytes]:
+    content_types = content_types.replace(
+        b"</Types>",
+        b'<Override PartName="/%s" ContentType="%s"/></Types>'
+        % (shared_strings.encode(), SHARED_STRINGS_CONTENT_TYPE.encode()),
+    )
+
+    ids = re.findall(rb'Id="rId(\d+)"', workbook_relationships)
+    relationship_id = max((int(i) for i in ids), default=0) + 1
+    workbook_relationships = workbook_relationships.replace(
+        b"</Relationships>",
+        b'<Relationship Id="rId%d" Type="%s" Target="sharedStrings.xml"/></Relationships>'
+        % (relationship_id, SHARED_STRINGS_TYPE.encode()),
+    )
+
+    return content_types, workbook_relationships
+
+
+def copy_to_xlsx_template(
+    *,
+    dataframe: pd.DataFrame,
+    filename: str,
+    template_filename: str,
+    column_mapping: dict[int, ExcelColumn],
+):
+    """
+    Copies data from a pandas DataFrame into an Excel template by patching the xlsx archive directly.
+    Args:
+        dataframe (pd.DataFrame): The DataFrame containing the data to be copied into the Excel template.
+        filename (str): The output filename where the resulting Excel file will be saved. The file will be saved with a '.xlsx' extension.
+        template_filename (str): The path to the Excel template file (.xlsx) to be used as a base for the output.
+        column_mapping (dict[int, ExcelColumn]): A dictionary mapping column indices to ExcelColumn objects, which specify the DataFrame column name and the corresponding Excel column (alphabet).
+    Notes:
+        - Unlike copy_to_openpyxl_template, the template is never loaded as a workbook. Only the active worksheet XML
+          is rewritten (in a streaming fashion) and the new values are appended to the shared strings table.
+        - Every other member of the archive (styles, other sheets, images, ...) is copied over unchanged.
+        - Values are written starting from the second row, the header row of the template is kept as it is.
+        - The output file will overwrite any existing file with the same name.
+    """
+    rows = len(dataframe)
+    strings: dict[str, int] = {}
+    columns: dict[int, bytes] = {}
+    column_values: dict[int, list[str | None]] = {}
+
+    for attr in column_mapping.values():
+        column = excel_to_col(attr.alphabet)
+        columns[column] = attr.alphabet.encode()
+        column_values[column] = [
+            None if pd.isna(value) else str(value)
+            for value in dataframe[attr.name].tolist()
+        ]
+
+    with zipfile.ZipFile(template_filename) as template, zipfile.ZipFile(
+        filename.replace(".csv", ".xlsx"), "w", zipfile.ZIP_DEFLATED
+    ) as output:
+        workbook, worksheet, shared_strings, calc_chain = find_workbook_parts(template)
+
+        existing_strings = 0
+        prefix = b""
+        if shared_strings:
+            with template.open(shared_strings) as f:
+                prefix = shared_strings_prefix(f)
+            with template.open(shared_strings) as f:
+                existing_strings = count_occurrences(
+                    f, (b"<%ssi>" % prefix, b"<%ssi/>" % prefix)
+                )
+
+        values: dict[int, list[int | None]] = {
+            column: [
+                None
+                if value is None
+                else strings.setdefault(value, existing_strings + len(strings))
+                for value in column_values[column]
+            ]
+            for column in columns
+        }
+
+        references = sum(
+            value is not None for column in columns for value in values[column]
+        )
+
+        # ? Parts that have to be rewritten to register a new shared strings table or drop the calculation chain
+        patched_parts: dict[str, bytes] = {}
+        new_shared_strings = shared_strings is None
+        if shared_strings is None or calc_chain is not None:
+            content_types = template.read("[Content_Types].xml")
+            workbook_relationships = template.read(relationships_path(workbook))
+
+            if shared_strings is None:
+                shared_strings = posixpath.join(
+                    posixpath.dirname(workbook), "sharedStrings.xml"
+                )
+                content_types, workbook_relationships = add_shared_strings_part(
+                    content_types, workbook_relationships, shared_strings
+                )
+            if calc_chain is not None:
+                content_types, workbook_relationships = remove_calc_chain_part(
+                    content_types, workbook_relationships, calc_chain
+                )
+
+            patched_parts = {
+                "[Content_Types].xml": content_types,
+                relationships_path(workbook): workbook_relationships,
+            }
+
+        for info in template.infolist():
+            if info.filename == calc_chain:
+                continue
+            if info.filename == worksheet:
+                with template.open(info) as source, output.open(
+                    info.filename, "w"
+                ) as destination:
+                    patcher = SheetPatcher(destination, columns, values, rows)
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                        patcher.feed(chunk)
+                    patcher.close()
+            elif info.filename == shared_strings:
+                with template.open(info) as source, output.open(
+                    info.filename, "w"
+                ) as destination:
+                    append_shared_strings(
+                        source, destination, list(strings), references, prefix
+                    )
+            elif info.filename in patched_parts:
+                output.writestr(info, patched_parts[info.filename])
+            else:
+                with template.open(info) as source, output.open(
+                    info, "w"
+                ) as destination:
+                    shutil.copyfileobj(source, destination, CHUNK_SIZE)
+
+        if new_shared_strings:
+            with output.open(shared_strings, "w") as destination:
+                append_shared_strings(None, destination, list(strings), references)
@@ -2,11 +2,21 @@ import asyncio
 import os
 
 from argparse import ArgumentParser
+from argparse import ArgumentTypeError
 from multiprocessing import freeze_support
 
 from html_style_enhancer.enhance import TODAY_DATE
 from html_style_enhancer.log import logger
+from html_style_enhancer.preflight import ON_ERROR_CHOICES
 from html_style_enhancer.settings import Settings
+from html_style_enhancer.shard import parse_shard
+
+
+def positive_int(text: str) -> int:
+    value = int(text)
+    if value < 1:
+        raise ArgumentTypeError(f"must be at least 1 (got {value})")
+    return value
 
 
 if __name__ == "__main__":
@@ -32,15 +42,13 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--input_file",
-        help="Input file",
+        help="Input file (required unless --watch is given)",
         type=str,
-        required=True,
     )
     parser.add_argument(
         "--output_file",
-        help="Output file",
+        help="Output file (required unless --watch is given)",
         type=str,
-        required=True,
     )
     parser.add_argument(
         "--html_source_column",
@@ -84,16 +92,79 @@ if __name__ == "__main__":
         type=str,
         required=True,
     )
+    parser.add_argument(
+        "--queue_size",
+        help="Maximum number of batches (of 64 rows) buffered between the read, styling and write stages",
+        type=positive_int,
+        default=8,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of processes used for styling the rows",
+        type=positive_int,
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--output_engine",
+        help="How the output is copied into the input file template: load it with openpyxl, or patch the xlsx (zip) archive directly which is much faster for large templates",
+        type=str,
+        choices=["openpyxl", "zip"],
+        default="openpyxl",
+    )
+    parser.add_argument(
+        "--on_error",
+        help="What to do with the rows that can't be styled: fail before styling anything, leave the modified HTML empty (skip), or copy the original HTML (keep-original)",
+        type=str,
+        choices=ON_ERROR_CHOICES,
+        default="fail",
+    )
+    distribution = parser.add_mutually_exclusive_group()
+    distribution.add_argument(
+        "--shard",
+        help="Only process the i-th of N equal row ranges of the input file (e.g., 2/4) and save a partial result to be merged",
+        type=parse_shard,
+    )
+    distribution.add_argument(
+        "--merge",
+        help="Merge the partial results of every shard into the output file, instead of processing the input file",
+        type=str,
+        nargs="+",
+    )
+    distribution.add_argument(
+        "--watch",
+        help="Keep running and enhance every .xlsx file added to this directory (--input_file and --output_file are not used)",
+        type=str,
+    )
+    parser.add_argument(
+        "--watch_interval",
+        help="Seconds between two scans of the watched directory",
+        type=float,
+        default=2.0,
+    )
+    parser.add_argument(
+        "--watch_concurrency",
+        help="Number of files of the watched directory processed at the same time",
+        type=positive_int,
+        default=1,
+    )
     args = parser.parse_args()
 
+    if args.gui and (args.shard or args.merge or args.watch):
+        parser.error("--shard, --merge and --watch are not supported in GUI mode")
+    if not args.watch and not (args.input_file and args.output_file):
+        parser.error(
+            "--input_file and --output_file are required unless --watch is given"
+        )
+
     os.makedirs(os.path.join("output", TODAY_DATE), exist_ok=True)
     os.makedirs(os.path.join("temp", TODAY_DATE), exist_ok=True)
 
     settings = Settings(
         test_mode=args.test_mode,
         log_file=args.log_file,
-        input_file=args.input_file,
-        output_file=args.output_file,
+        # ? Each watched file has its own input and output file
+        input_file=args.input_file or "",
+        output_file=args.output_file or "",
         selector=args.selector,
         font=args.font,
         font_size=args.font_size,
@@ -103,6 +174,15 @@ if __name__ == "__main__":
         html_source_modified_column=args.html_source_modified_column.replace(
             "\\n", "\n"
         ),
+        queue_size=args.queue_size,
+        workers=args.workers,
+        output_engine=args.output_engine,
+        on_error=args.on_error,
+        shard=args.shard,
+        merge_files=tuple(args.merge or ()),
+        watch_directory=args.watch,
+        watch_interval=args.watch_interval,
+        watch_concurrency=args.watch_concurrency,
     )
 
     if args.gui:
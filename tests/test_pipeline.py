@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+
+from functools import partial
+
+import pytest
+
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from html_style_enhancer.enhance import iter_html_sources
+from html_style_enhancer.enhance import style_html
+from html_style_enhancer.pipeline import batched
+from html_style_enhancer.pipeline import run_pipeline
+from html_style_enhancer.settings import Settings
+
+
+HTML_SOURCE_COLUMN = "상품상세설명\n[필수]"
+HTML_SOURCE_MODIFIED_COLUMN = "상품상세설명\n[사방넷]"
+
+
+def make_settings(input_file: str = "", workers: int = 2) -> Settings:
+    return Settings(
+        test_mode=False,
+        log_file="",
+        input_file=input_file,
+        output_file="",
+        selector="div",
+        font="Roboto",
+        font_size=24,
+        font_color="red",
+        background_image="",
+        html_source_column=HTML_SOURCE_COLUMN,
+        html_source_modified_column=HTML_SOURCE_MODIFIED_COLUMN,
+        queue_size=2,
+        workers=workers,
+        on_error="skip",
+    )
+
+
+def test_iter_html_sources_reads_like_pandas(tmp_path):
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(["id", HTML_SOURCE_COLUMN, HTML_SOURCE_MODIFIED_COLUMN])
+    worksheet.append([1, "<div>1</div>", None])
+    worksheet.append([None, None, None])
+    worksheet.append([3, None, "old"])
+    worksheet.append([4, 5.0, None])
+    worksheet.append([5, "", ""])
+    # ? Formatted but empty rows at the end of the sheet
+    worksheet["B10"].font = Font(b=True)
+    worksheet["A12"] = ""
+    input_file = str(tmp_path / "input.xlsx")
+    workbook.save(input_file)
+
+    chunks = list(iter_html_sources(make_settings(input_file), chunk_size=2))
+
+    assert [html_source for chunk in chunks for html_source in chunk] == [
+        "<div>1</div>",
+        "nan",
+        "nan",
+        "5",
+        "nan",
+    ]
+    assert len(chunks) == 2
+
+
+def test_iter_html_sources_checks_columns(tmp_path):
+    workbook = Workbook()
+    workbook.active.append(["id", HTML_SOURCE_COLUMN])
+    input_file = str(tmp_path / "input.xlsx")
+    workbook.save(input_file)
+
+    with pytest.raises(KeyError):
+        list(iter_html_sources(make_settings(input_file)))
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_pipeline_keeps_the_order_of_the_rows(tmp_path, workers: int):
+    html_sources = [
+        f'<div style="a"><p style="b">{idx}</p></div>' if idx % 5 else "<p>bad</p>"
+        for idx in range(23)
+    ]
+    written: list[tuple[list[str], list[str]]] = []
+
+    result = asyncio.run(
+        run_pipeline(
+            make_settings(workers=workers),
+            batched(html_sources, 4),
+            partial(style_html, selector="div", styling="color:red;", on_error="skip"),
+            str(tmp_path / "temp"),
+            first_row=10,
+            on_rows=lambda *batch: written.append(batch),
+        )
+    )
+
+    expected = [
+        style_html(html_source, selector="div", styling="color:red;", on_error="skip")
+        for html_source in html_sources
+    ]
+
+    assert result.html_sources == html_sources
+    assert result.modified_htmls == [modified_html for modified_html, _ in expected]
+    assert list(result.problems) == [10 + idx for idx in range(0, 23, 5)]
+    assert [html for batch, _ in written for html in batch] == html_sources
+    last_temp_file = tmp_path / "temp" / f"html_{10 + len(html_sources) - 1}.html"
+    assert last_temp_file.read_text(encoding="utf-8") == expected[-1][0]
+
+
+def test_pipeline_passes_skipped_rows_through(tmp_path):
+    html_sources = [
+        f'<div style="a"><p style="b">{idx}</p></div>' + ("<!-- done -->" * (idx % 2))
+        for idx in range(9)
+    ]
+
+    result = asyncio.run(
+        run_pipeline(
+            make_settings(),
+            batched(html_sources, 4),
+            partial(style_html, selector="div", styling="color:red;", on_error="skip"),
+            str(tmp_path / "temp"),
+            skip=lambda html_source: "<!-- done -->" in html_source,
+        )
+    )
+
+    assert result.skipped == 4
+    assert result.modified_htmls[1::2] == html_sources[1::2]
+    assert result.modified_htmls[::2] != html_sources[::2]
+    assert sorted(path.name for path in (tmp_path / "temp").iterdir()) == sorted(
+        f"html_{idx}.html" for idx in range(1, 10, 2)
+    )
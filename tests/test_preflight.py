@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import pytest
+
+from bs4 import BeautifulSoup
+
+from html_style_enhancer.enhance import style_html
+from html_style_enhancer.preflight import check_html
+from html_style_enhancer.preflight import find_styled_element
+from html_style_enhancer.preflight import parse_simple_selector
+
+
+HTMLS = [
+    '<div style="a"><p style="b">text</p> <img style="c" src="x"></div>',
+    '<div style="a"><p style="b">text</p>bare text</div>',
+    '<div style="a"><p>text</p></div>',
+    '<div><p style="b">text</p></div>',
+    '<span style="a">no div</span>',
+    '<div style="a"><!-- comment --><p style="b"></p></div>',
+    '<div style="a"><p style="b"><b>nested</b></p></div><p>after</p>',
+    '<div style="a"><p style="b">unclosed</div><p>after</p>',
+    '<div style="a"/><p>after</p>',
+    '<section><div class="detail x" id="d" data-k="v" style="a"><br></div></section>',
+    '<div style="a">&amp;</div>',
+    '<div style="a"><![CDATA[x]]><p style="b"></p></div>',
+    '<div style="a"><!DOCTYPE html><p style="b"></p></div>',
+    '<div style="a"><?xml version="1.0"?><p style="b"></p></div>',
+    '<div style="a"><p style="b"><![CDATA[nested]]><!DOCTYPE html></p></div>',
+    '<!DOCTYPE html><div style="a"><p style="b"></p></div>',
+    "",
+]
+
+SELECTORS = [
+    "div",
+    "DIV",
+    "*",
+    "div.detail",
+    ".x.detail",
+    "#d",
+    "div[data-k]",
+    'div[data-k="v"]',
+    "[data-k=v]",
+]
+
+
+def check_with_beautifulsoup(html_source: str, selector: str) -> str | None:
+    try:
+        find_styled_element(BeautifulSoup(html_source, "html.parser"), selector)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+@pytest.mark.parametrize("selector", SELECTORS)
+@pytest.mark.parametrize("html_source", HTMLS)
+def test_streaming_check_matches_beautifulsoup(html_source: str, selector: str):
+    assert parse_simple_selector(selector) is not None
+    assert check_html(html_source, selector=selector) == check_with_beautifulsoup(
+        html_source, selector
+    )
+
+
+@pytest.mark.parametrize(
+    "selector", ["section div", "section > div", "div:first-child", "p, div", ""]
+)
+def test_other_selectors_fall_back_to_beautifulsoup(selector: str):
+    assert parse_simple_selector(selector) is None
+
+
+@pytest.mark.parametrize(
+    "on_error, expected", [("skip", ""), ("keep-original", HTMLS[3])]
+)
+def test_style_html_reports_problem(on_error: str, expected: str):
+    modified_html, problem = style_html(
+        HTMLS[3], selector="div", styling="color:red;", on_error=on_error
+    )
+
+    assert modified_html == expected
+    assert problem == "Element 'div' has no style attribute"
+
+
+def test_style_html_raises_on_fail():
+    with pytest.raises(ValueError):
+        style_html(HTMLS[3], selector="div", styling="color:red;")
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+from argparse import ArgumentTypeError
+from dataclasses import replace
+
+import pandas as pd
+import pytest
+
+from html_style_enhancer.enhance import TODAY_DATE
+from html_style_enhancer.enhance import enhance
+from html_style_enhancer.settings import Settings
+from html_style_enhancer.shard import enhance_shard
+from html_style_enhancer.shard import merge
+from html_style_enhancer.shard import parse_shard
+from html_style_enhancer.shard import shard_filename
+from html_style_enhancer.shard import shard_range
+
+
+HTML_SOURCE_COLUMN = "상품상세설명\n[필수]"
+HTML_SOURCE_MODIFIED_COLUMN = "상품상세설명\n[사방넷]"
+
+
+@pytest.mark.parametrize("text, expected", [("1/1", (1, 1)), (" 2/4 ", (2, 4))])
+def test_parse_shard(text: str, expected: tuple[int, int]):
+    assert parse_shard(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "1", "1/", "a/b", "0/2", "3/2", "-1/2"])
+def test_parse_shard_rejects_invalid_text(text: str):
+    with pytest.raises(ArgumentTypeError):
+        parse_shard(text)
+
+
+@pytest.mark.parametrize("rows", [0, 1, 2, 7, 100, 1001])
+@pytest.mark.parametrize("shards", [1, 2, 3, 8, 13])
+def test_shard_ranges_cover_every_row_exactly_once(rows: int, shards: int):
+    ranges = [shard_range(rows, shard, shards) for shard in range(1, shards + 1)]
+
+    assert [row for rows_range in ranges for row in rows_range] == list(range(rows))
+    assert max(map(len, ranges)) - min(map(len, ranges)) <= 1
+
+
+def test_merge_matches_single_run(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join("output", TODAY_DATE))
+
+    html_sources = [
+        f'<div style="margin:0"><p style="color:red">Row {idx}</p></div>'
+        for idx in range(11)
+    ]
+    # ? Rows that can't be styled are kept as they are
+    html_sources[4] = "<p>no div</p>"
+    pd.DataFrame(
+        {
+            "id": range(len(html_sources)),
+            HTML_SOURCE_COLUMN: html_sources,
+            HTML_SOURCE_MODIFIED_COLUMN: [""] * len(html_sources),
+        }
+    ).to_excel("input.xlsx", index=False)
+
+    settings = Settings(
+        test_mode=False,
+        log_file=os.devnull,
+        input_file="input.xlsx",
+        output_file="single.xlsx",
+        selector="div",
+        font="Roboto",
+        font_size=24,
+        font_color="rgb(112, 69, 69)",
+        background_image="",
+        html_source_column=HTML_SOURCE_COLUMN,
+        html_source_modified_column=HTML_SOURCE_MODIFIED_COLUMN,
+        workers=1,
+        on_error="keep-original",
+    )
+    asyncio.run(enhance(settings))
+
+    shards = 3
+    sharded_settings = replace(settings, output_file="merged.xlsx")
+    for shard in range(1, shards + 1):
+        asyncio.run(enhance_shard(sharded_settings, shard, shards))
+    asyncio.run(
+        merge(
+            sharded_settings,
+            tuple(
+                shard_filename(sharded_settings, shard, shards)
+                for shard in range(shards, 0, -1)
+            ),
+        )
+    )
+
+    single = pd.read_excel(os.path.join("output", TODAY_DATE, "single.xlsx"))
+    merged = pd.read_excel(os.path.join("output", TODAY_DATE, "merged.xlsx"))
+
+    pd.testing.assert_frame_equal(merged, single)
+    assert "font-family:'Roboto'" in single[HTML_SOURCE_MODIFIED_COLUMN][0]
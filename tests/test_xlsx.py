@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import io
+import zipfile
+
+from xml.sax.saxutils import escape
+
+import pandas as pd
+import pytest
+
+from openpyxl import load_workbook
+
+from html_style_enhancer.excel import copy_to_openpyxl_template
+from html_style_enhancer.excel import get_column_mapping
+from html_style_enhancer.xlsx import NS_MAIN
+from html_style_enhancer.xlsx import SheetPatcher
+from html_style_enhancer.xlsx import append_shared_strings
+from html_style_enhancer.xlsx import copy_to_xlsx_template
+
+
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PACKAGE_R = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_CONTENT_TYPES = "http://schemas.openxmlformats.org/package/2006/content-types"
+RELATIONSHIP_TYPE = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+)
+CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+
+STYLES = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="{NS_MAIN}">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>
+</styleSheet>"""
+
+BOLD = 1
+
+# ? Value and style of each cell of each row (None for an empty cell)
+Rows = list[list[tuple[str | int | None, int]]]
+
+
+def column_letter(index: int) -> str:
+    return chr(ord("A") + index)
+
+
+def build_template(
+    filename: str,
+    sheets: dict[str, Rows],
+    *,
+    active: int = 0,
+    shared_strings: bool = True,
+    prefix: str = "",
+    calc_chain: bool = False,
+):
+    """
+    Writes a minimal xlsx by hand, so that every test controls how the parts patched by the zip engine look
+    """
+    strings: list[str] = []
+
+    def cell_xml(reference: str, value: str | int | None, style: int) -> str:
+        style_attribute = f' s="{style}"' if style else ""
+        if value is None:
+            return f'<{prefix}c r="{reference}"{style_attribute}/>'
+        if isinstance(value, str) and value.startswith("="):
+            return f'<{prefix}c r="{reference}"{style_attribute}><{prefix}f>{escape(value[1:])}</{prefix}f><{prefix}v>0</{prefix}v></{prefix}c>'
+        if isinstance(value, int):
+            return f'<{prefix}c r="{reference}"{style_attribute}><{prefix}v>{value}</{prefix}v></{prefix}c>'
+        if shared_strings:
+            strings.append(value)
+            return f'<{prefix}c r="{reference}"{style_attribute} t="s"><{prefix}v>{len(strings) - 1}</{prefix}v></{prefix}c>'
+        return f'<{prefix}c r="{reference}"{style_attribute} t="inlineStr"><{prefix}is><{prefix}t>{escape(value)}</{prefix}t></{prefix}is></{prefix}c>'
+
+    namespace = f'xmlns:{prefix[:-1]}="{NS_MAIN}"' if prefix else f'xmlns="{NS_MAIN}"'
+
+    worksheets: list[str] = []
+    for rows in sheets.values():
+        rows_xml = "".join(
+            f'<{prefix}row r="{row}">'
+            + "".join(
+                cell_xml(f"{column_letter(column)}{row}", value, style)
+                for column, (value, style) in enumerate(cells)
+            )
+            + f"</{prefix}row>"
+            for row, cells in enumerate(rows, start=1)
+        )
+        last_cell = f"{column_letter(max(len(cells) for cells in rows) - 1)}{len(rows)}"
+        worksheets.append(
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<{prefix}worksheet {namespace}>'
+            f'<{prefix}dimension ref="A1:{last_cell}"/>'
+            f"<{prefix}sheetData>{rows_xml}</{prefix}sheetData></{prefix}worksheet>"
+        )
+
+    relationships = [
+        (f"worksheets/sheet{idx}.xml", "worksheet") for idx in range(1, len(sheets) + 1)
+    ] + [("styles.xml", "styles")]
+    if shared_strings:
+        relationships.append(("sharedStrings.xml", "sharedStrings"))
+    if calc_chain:
+        relationships.append(("calcChain.xml", "calcChain"))
+
+    overrides = [
+        (f"/xl/worksheets/sheet{idx}.xml", "worksheet+xml")
+        for idx in range(1, len(sheets) + 1)
+    ] + [("/xl/workbook.xml", "sheet.main+xml"), ("/xl/styles.xml", "styles+xml")]
+    if shared_strings:
+        overrides.append(("/xl/sharedStrings.xml", "sharedStrings+xml"))
+    if calc_chain:
+        overrides.append(("/xl/calcChain.xml", "calcChain+xml"))
+
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="{NS_CONTENT_TYPES}">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            + "".join(
+                f'<Override PartName="{part}" ContentType="{CONTENT_TYPE}.{content_type}"/>'
+                for part, content_type in overrides
+            )
+            + "</Types>",
+        )
+        archive.writestr(
+            "_rels/.rels",
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_PACKAGE_R}">'
+            f'<Relationship Id="rId1" Type="{RELATIONSHIP_TYPE}/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>",
+        )
+        archive.writestr(
+            "xl/workbook.xml",
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_R}">'
+            f'<bookViews><workbookView activeTab="{active}"/></bookViews><sheets>'
+            + "".join(
+                f'<sheet name="{name}" sheetId="{idx}" r:id="rId{idx}"/>'
+                for idx, name in enumerate(sheets, start=1)
+            )
+            + "</sheets></workbook>",
+        )
+        archive.writestr(
+            "xl/_rels/workbook.xml.rels",
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_PACKAGE_R}">'
+            + "".join(
+                f'<Relationship Id="rId{idx}" Type="{RELATIONSHIP_TYPE}/{kind}" Target="{target}"/>'
+                for idx, (target, kind) in enumerate(relationships, start=1)
+            )
+            + "</Relationships>",
+        )
+        archive.writestr("xl/styles.xml", STYLES)
+        if calc_chain:
+            archive.writestr(
+                "xl/calcChain.xml",
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<calcChain xmlns="{NS_MAIN}"><c r="C2" i="1"/></calcChain>',
+            )
+        for idx, worksheet in enumerate(worksheets, start=1):
+            archive.writestr(f"xl/worksheets/sheet{idx}.xml", worksheet)
+        if shared_strings:
+            archive.writestr(
+                "xl/sharedStrings.xml",
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<{prefix}sst {namespace} count="{len(strings)}" uniqueCount="{len(strings)}">'
+                + "".join(
+                    f"<{prefix}si><{prefix}t>{escape(text)}</{prefix}t></{prefix}si>"
+                    for text in strings
+                )
+                + f"</{prefix}sst>",
+            )
+
+
+def read_cells(filename: str) -> dict[str, list[list[tuple]]]:
+    workbook = load_workbook(filename)
+    return {
+        worksheet.title: [
+            [(cell.value, bool(cell.font.b)) for cell in row]
+            for row in worksheet.iter_rows()
+        ]
+        for worksheet in workbook.worksheets
+    }
+
+
+def assert_same_as_openpyxl(template: str, dataframe: pd.DataFrame, tmp_path):
+    column_mapping = get_column_mapping(
+        pd.read_excel(template, sheet_name=load_workbook(template).active.title),
+        dataframe,
+    )
+    assert column_mapping
+
+    expected = str(tmp_path / "openpyxl.xlsx")
+    actual = str(tmp_path / "zip.xlsx")
+
+    copy_to_openpyxl_template(
+        dataframe=dataframe,
+        filename=expected,
+        template_filename=template,
+        column_mapping=column_mapping,
+    )
+    copy_to_xlsx_template(
+        dataframe=dataframe,
+        filename=actual,
+        template_filename=template,
+        column_mapping=column_mapping,
+    )
+
+    assert read_cells(actual) == read_cells(expected)
+
+
+def catalog(rows: int) -> Rows:
+    return [[("id", 0), ("source", 0), ("modified", 0), ("other", 0)]] + [
+        [(idx, 0), (f"source {idx}", 0), (f"old {idx}", BOLD), ("keep", BOLD)]
+        for idx in range(rows)
+    ]
+
+
+def dataframe(rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "source": [f"<p>source {idx}</p>" for idx in range(rows)],
+            "modified": [f'<p style="color:red">new {idx}</p>' for idx in range(rows)],
+        },
+        dtype="str",
+    )
+
+
+@pytest.mark.parametrize("prefix", ["", "x:"])
+def test_same_rows_as_template(tmp_path, prefix):
+    template = str(tmp_path / "template.xlsx")
+    build_template(template, {"Sheet1": catalog(5)}, prefix=prefix)
+
+    assert_same_as_openpyxl(template, dataframe(5), tmp_path)
+
+
+def test_inactive_first_sheet(tmp_path):
+    template = str(tmp_path / "template.xlsx")
+    build_template(
+        template,
+        {"Cover": [[("title", BOLD), ("keep", 0)]], "Catalog": catalog(3)},
+        active=1,
+    )
+
+    assert_same_as_openpyxl(template, dataframe(3), tmp_path)
+
+
+@pytest.mark.parametrize("prefix", ["", "x:"])
+def test_more_data_rows_than_template_rows(tmp_path, prefix):
+    template = str(tmp_path / "template.xlsx")
+    build_template(template, {"Sheet1": catalog(2)}, prefix=prefix)
+
+    assert_same_as_openpyxl(template, dataframe(7), tmp_path)
+
+
+def test_template_without_shared_strings(tmp_path):
+    template = str(tmp_path / "template.xlsx")
+    build_template(template, {"Sheet1": catalog(4)}, shared_strings=False)
+
+    assert_same_as_openpyxl(template, dataframe(6), tmp_path)
+
+
+def test_text_needing_xml_escaping(tmp_path):
+    template = str(tmp_path / "template.xlsx")
+    build_template(template, {"Sheet1": catalog(3)})
+
+    texts = [
+        """<div style="font-family:'Roboto'">A & B</div>""",
+        "  leading and trailing spaces  ",
+        "한국어 <b>상품</b> &amp; ]]>",
+    ]
+    assert_same_as_openpyxl(
+        template,
+        pd.DataFrame({"source": texts, "modified": texts[::-1]}, dtype="str"),
+        tmp_path,
+    )
+
+
+def test_sheet_without_sheet_data_raises():
+    patcher = SheetPatcher(io.BytesIO(), {1: b"A"}, {1: [0]}, rows=1)
+    patcher.feed(f'<worksheet xmlns="{NS_MAIN}"><dimension ref="A1"/>'.encode())
+    patcher.feed(b"</worksheet>")
+
+    with pytest.raises(ValueError):
+        patcher.close()
+
+
+def test_calc_chain_is_dropped(tmp_path):
+    template = str(tmp_path / "template.xlsx")
+    rows = catalog(3)
+    rows[1][2] = ("=A2*2", BOLD)
+    build_template(template, {"Sheet1": rows}, calc_chain=True)
+
+    assert_same_as_openpyxl(template, dataframe(3), tmp_path)
+
+    with zipfile.ZipFile(tmp_path / "zip.xlsx") as archive:
+        assert "xl/calcChain.xml" not in archive.namelist()
+        assert b"calcChain" not in archive.read("[Content_Types].xml")
+        assert b"calcChain" not in archive.read("xl/_rels/workbook.xml.rels")
+
+
+@pytest.mark.parametrize(
+    "start_tag, expected_start_tag",
+    [
+        ('<sst count="4" uniqueCount="1">', '<sst count="7" uniqueCount="3">'),
+        ("<sst uniqueCount='1'>", "<sst uniqueCount='3'>"),
+        ('<sst uniqueCount="1">', '<sst uniqueCount="3">'),
+        ('<sst count="1">', '<sst count="4">'),
+    ],
+)
+def test_append_shared_strings_only_patches_the_start_tag(
+    start_tag: str, expected_start_tag: str
+):
+    content = '<si><t>&lt;ol count="5" data-count="6"&gt;</t></si>'
+    destination = io.BytesIO()
+
+    append_shared_strings(
+        io.BytesIO(f"{start_tag}{content}</sst>".encode()),
+        destination,
+        ["a", "b"],
+        references=3,
+    )
+
+    result = destination.getvalue().decode()
+    assert result.startswith(f"{expected_start_tag}{content}")
+    assert result.count("<si>") == 3